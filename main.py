@@ -1,39 +1,138 @@
-import json
+import asyncio
+import contextlib
 import datetime
-from typing import Dict, Any, Set
+from typing import Dict, Any, List, Optional, Set, Tuple, Union
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Body
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
+from serialization import dumps, unpack_publish
 
-# Allow frontend (React) to connect
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # change to ["http://localhost:5173"] for stricter setup
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+UTC = datetime.timezone.utc
 
 # Store connected WebSocket clients
 publish_clients: Set[WebSocket] = set()
-dashboard_clients: Set[WebSocket] = set()
+# Each dashboard gets a bounded outgoing queue drained by its
+# dashboard_writer() task. One item is one broadcast (a whole flush counts
+# once), so the limit is how many broadcasts a client may fall behind before
+# it is dropped.
+DASHBOARD_QUEUE_SIZE = 32
+dashboard_clients: Dict[WebSocket, Tuple[asyncio.Queue, asyncio.Task]] = {}
+# Close handshakes of dropped dashboards; referenced so they aren't collected
+closing_tasks: Set[asyncio.Task] = set()
 
 # Store latest junction states (like an in-memory DB)
 junctions: Dict[str, Dict[str, Any]] = {}
+# Serialized snapshot of `junctions`; reset to None whenever it changes
+cached_snapshot: Optional[bytes] = None
+
+# Latest unsent junction_update per junction, serialized by flusher()
+FLUSH_INTERVAL = 0.1  # seconds
+pending: Dict[str, Dict[str, Any]] = {}
+flush_event = asyncio.Event()
 
 # Broadcast helper
-async def broadcast(message: str):
-    """Send message to all connected dashboard clients."""
-    dead_clients = []
-    for client in dashboard_clients:
+def broadcast(message: Union[bytes, List[bytes]]):
+    """Queue an already-serialized message for all connected dashboard clients.
+
+    Callers serialize once; payloads go out as binary frames so no text
+    codec runs for any client. A list of frames takes a single
+    queue slot and is sent back-to-back. A dashboard whose queue is full
+    can't keep up and is dropped instead of stalling the fan-out. Nothing
+    here awaits a socket, so callers (including the REST override) return
+    without waiting on dashboard sends.
+    """
+    # No await points, so iterate the live dict and drop afterwards
+    slow_clients = []
+    for client, (queue, _) in dashboard_clients.items():
         try:
-            await client.send_text(message)
-        except Exception:
-            dead_clients.append(client)
-    for client in dead_clients:
-        dashboard_clients.remove(client)
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            slow_clients.append(client)
+    for client in slow_clients:
+        drop_dashboard(client)
+
+
+def drop_dashboard(ws: WebSocket):
+    """Stop feeding a dashboard, cancel its writer and close the socket.
+
+    The writer is usually stuck in a send on the stalled socket, so it is
+    cancelled rather than asked to finish.
+    """
+    entry = dashboard_clients.pop(ws, None)
+    if entry is None:
+        return
+    _, writer = entry
+    writer.cancel()
+    task = asyncio.create_task(close_dashboard(ws))
+    closing_tasks.add(task)
+    task.add_done_callback(closing_tasks.discard)
+
+
+async def close_dashboard(ws: WebSocket):
+    # The client may already be gone; there is nothing left to clean up then
+    with contextlib.suppress(Exception):
+        await ws.close(code=1013)  # try again later
+
+
+async def dashboard_writer(ws: WebSocket, queue: asyncio.Queue):
+    """Drain one dashboard's queue onto its socket."""
+    try:
+        while True:
+            message = await queue.get()
+            if isinstance(message, list):
+                for frame in message:
+                    await ws.send_bytes(frame)
+            else:
+                await ws.send_bytes(message)
+    except Exception:
+        dashboard_clients.pop(ws, None)
+
+
+def get_snapshot() -> bytes:
+    """Return the serialized junction snapshot, rebuilding it if stale."""
+    global cached_snapshot
+    if cached_snapshot is None:
+        cached_snapshot = dumps({
+            "type": "snapshot",
+            "junctions": list(junctions.values())
+        })
+    return cached_snapshot
+
+
+async def flusher():
+    """Broadcast coalesced junction updates at most every FLUSH_INTERVAL."""
+    while True:
+        await flush_event.wait()
+        flush_event.clear()
+        batch = [dumps(msg) for msg in pending.values()]
+        pending.clear()
+        broadcast(batch)  # one queue slot per flush, however many junctions
+        await asyncio.sleep(FLUSH_INTERVAL)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run flusher() for the lifetime of the app."""
+    task = asyncio.create_task(flusher())
+    try:
+        yield
+    finally:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Allow frontend (React) to connect
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=["*"],  # change to ["http://localhost:5173"] for stricter setup
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 
 # -------------------------------------------------
@@ -41,18 +140,28 @@ async def broadcast(message: str):
 # -------------------------------------------------
 @app.websocket("/ws/publish")
 async def ws_publish(ws: WebSocket):
+    global cached_snapshot
     await ws.accept()
     publish_clients.add(ws)
     try:
         while True:
-            data = await ws.receive_text()
-            msg = json.loads(data)
+            # Publishers send msgpack; dashboards still get JSON
+            data = await ws.receive_bytes()
+            msg = unpack_publish(data)
 
             if msg.get("type") == "junction_update":
                 jid = msg["junction_id"]
                 junctions[jid] = msg  # update state
-                # Broadcast update to dashboards
-                await broadcast(json.dumps(msg))
+                cached_snapshot = None
+                # Only the latest update per junction is forwarded on the
+                # next flush, but violations are events, not state: carry
+                # any unsent ones over so they still reach the dashboards
+                previous = pending.get(jid)
+                if previous is not None and previous.get("violations"):
+                    msg = dict(msg)
+                    msg["violations"] = previous["violations"] + (msg.get("violations") or [])
+                pending[jid] = msg
+                flush_event.set()
 
     except WebSocketDisconnect:
         publish_clients.remove(ws)
@@ -64,19 +173,19 @@ async def ws_publish(ws: WebSocket):
 @app.websocket("/ws/dashboard")
 async def ws_dashboard(ws: WebSocket):
     await ws.accept()
-    dashboard_clients.add(ws)
-    try:
-        # Send a snapshot on connect
-        snapshot = {
-            "type": "snapshot",
-            "junctions": list(junctions.values())
-        }
-        await ws.send_text(json.dumps(snapshot))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=DASHBOARD_QUEUE_SIZE)
 
-        while True:
-            await ws.receive_text()  # keep alive, ignore any input
-    except WebSocketDisconnect:
-        dashboard_clients.remove(ws)
+    # Send a snapshot on connect, ahead of any broadcast
+    queue.put_nowait(get_snapshot())
+    writer = asyncio.create_task(dashboard_writer(ws, queue))
+    dashboard_clients[ws] = (queue, writer)
+    try:
+        # Wait for the client to go away; any input is ignored undecoded
+        while (await ws.receive())["type"] != "websocket.disconnect":
+            pass
+    finally:
+        dashboard_clients.pop(ws, None)
+        writer.cancel()
 
 
 # -------------------------------------------------
@@ -89,22 +198,26 @@ async def override_junction(jid: str, payload: dict = Body(...)):
     - Set current_green = payload['lane']
     - Set phase_remaining = payload['duration']
     """
+    global cached_snapshot
     lane = payload.get("lane")
     duration = int(payload.get("duration", 20))
     operator = payload.get("operator", "manual")
     reason = payload.get("reason", "Manual override")
 
+    now = datetime.datetime.now(UTC)
+
     # Ensure junction exists
     if jid not in junctions:
         junctions[jid] = {"junction_id": jid}
 
     # Update state
+    cached_snapshot = None
     junctions[jid]["current_green"] = lane
     junctions[jid]["phase_remaining"] = duration
     junctions[jid]["override"] = {
         "operator": operator,
         "reason": reason,
-        "time": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        "time": now
     }
 
     # Build override event
@@ -112,11 +225,11 @@ async def override_junction(jid: str, payload: dict = Body(...)):
         "type": "override",
         "junction_id": jid,
         "payload": payload,
-        "ts": datetime.datetime.now(datetime.timezone.utc).isoformat()
+        "ts": now
     }
 
-    # Broadcast override to all dashboards
-    await broadcast(json.dumps(event))
+    # Serialize once and broadcast override to all dashboards
+    broadcast(dumps(event))
 
     return {
         "status": "ok",
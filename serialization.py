@@ -0,0 +1,22 @@
+# serialization.py
+"""Wire formats shared by the backend endpoints.
+
+- Dashboards receive JSON in binary WebSocket frames (``dumps``).
+- Publishers send msgpack in binary frames (``unpack_publish``).
+"""
+from typing import Any
+
+import msgpack
+import orjson
+
+# orjson formats datetimes in C; emit UTC as "...Z"
+ORJSON_OPTS = orjson.OPT_UTC_Z | orjson.OPT_NAIVE_UTC
+
+
+def dumps(obj: Any) -> bytes:
+    return orjson.dumps(obj, option=ORJSON_OPTS)
+
+
+def unpack_publish(data: bytes) -> Any:
+    # msgpack Timestamp ext comes back as an aware datetime
+    return msgpack.unpackb(data, timestamp=3)
@@ -1,61 +1,106 @@
 # simulator/publisher.py
 import asyncio
-import json
 import random
+import time
 import datetime
+import msgpack
+import numpy as np
+import orjson
 import websockets
 
-def now_iso():
-    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+try:
+    import uvloop
+except ImportError:  # optional; not available on Windows
+    uvloop = None
 
-def random_plate():
-    return f"KA{random.randint(1,99):02d}{random.choice(['AB','CD','EF','GH'])}{random.randint(1000,9999)}"
+def packb(obj):
+    # Publisher -> backend frames are msgpack; datetimes become Timestamp ext
+    return msgpack.packb(obj, datetime=True)
+
+_randint = random.randint
+_choice = random.choice
+_PLATE_SUFFIXES = ('AB', 'CD', 'EF', 'GH')
 
-# Track overrides locally
+def random_plate():
+    return f"KA{_randint(1,99):02d}{_choice(_PLATE_SUFFIXES)}{_randint(1000,9999)}"
+
+UTC = datetime.timezone.utc
+# Frames are small; permessage-deflate only costs CPU and latency here
+WS_OPTIONS = {"compression": None, "max_size": 2**20, "write_limit": 2**18}
+LANES = ("north", "east", "south", "west")
+rng = np.random.default_rng()
+
+JUNCTIONS = [
+    {"id": "J1", "lat": 12.9716, "lon": 77.5946, "name": "1st & Main"},
+    {"id": "J2", "lat": 12.9765, "lon": 77.5890, "name": "2nd & Park"},
+    {"id": "J3", "lat": 12.9670, "lon": 77.5980, "name": "3rd & Lake"}
+]
+# Junctions per publisher task; each shard gets its own connection
+SHARD_SIZE = 50
+
+# Track overrides locally: jid -> (lane, end time in time.monotonic_ns())
 active_overrides = {}
 
-async def publisher():
+async def publisher(junctions):
     uri = "ws://localhost:8000/ws/publish"
-    async with websockets.connect(uri) as ws:
-        print("✅ Connected to backend publisher WebSocket")
-
-        junctions = [
-            {"id": "J1", "lat": 12.9716, "lon": 77.5946, "name": "1st & Main"},
-            {"id": "J2", "lat": 12.9765, "lon": 77.5890, "name": "2nd & Park"},
-            {"id": "J3", "lat": 12.9670, "lon": 77.5980, "name": "3rd & Lake"}
-        ]
+    async with websockets.connect(uri, **WS_OPTIONS) as ws:
+        print(f"✅ Connected to backend publisher WebSocket ({len(junctions)} junctions)")
+
+        # Static part of each junction_update, built once
+        templates = {
+            j["id"]: {
+                "type": "junction_update",
+                "junction_id": j["id"],
+                "name": j["name"],
+                "lat": j["lat"],
+                "lon": j["lon"],
+            }
+            for j in junctions
+        }
 
         while True:
-            now = datetime.datetime.now(datetime.timezone.utc)
-
-            for j in junctions:
+            # One timestamp per tick, shared by every junction
+            now = datetime.datetime.now(UTC)
+            now_ns = time.monotonic_ns()
+
+            # Draw the whole tick's randomness in batched calls
+            n = len(junctions)
+            frames = []
+            tick_vehicles = rng.integers(0, 26, size=(n, len(LANES))).tolist()
+            tick_greens = rng.integers(0, len(LANES), size=n).tolist()
+            tick_phases = rng.integers(5, 31, size=n).tolist()
+            tick_confidence = rng.uniform(0.4, 0.98, size=n).round(2).tolist()
+            tick_emergency = (rng.random(n) < 0.1).tolist()
+            tick_violation = (rng.random(n) < 0.05).tolist()
+            tick_violation_lanes = rng.integers(0, len(LANES), size=n).tolist()
+
+            for i, j in enumerate(junctions):
                 jid = j["id"]
+                rl_suggestion = None
 
                 # Generate lanes
                 lanes = {
-                    "north": {"vehicles": random.randint(0, 25)},
-                    "east": {"vehicles": random.randint(0, 25)},
-                    "south": {"vehicles": random.randint(0, 25)},
-                    "west": {"vehicles": random.randint(0, 25)},
+                    lane: {"vehicles": vehicles, "density_score": vehicles}
+                    for lane, vehicles in zip(LANES, tick_vehicles[i])
                 }
-                for lane, data in lanes.items():
-                    data["density_score"] = data["vehicles"]
 
                 # Check if override is active
-                if jid in active_overrides and active_overrides[jid]["end_time"] > now:
-                    override = active_overrides[jid]
-                    current_green = override["lane"]
-                    phase_remaining = int((override["end_time"] - now).total_seconds())
+                override = active_overrides.get(jid)
+                if override is not None and override[1] <= now_ns:
+                    del active_overrides[jid]  # expired
+                    override = None
+                if override is not None:
+                    current_green = override[0]
+                    phase_remaining = (override[1] - now_ns) // 1_000_000_000
                 else:
                     # Normal AI logic
-                    current_green = random.choice(list(lanes.keys()))
-                    phase_remaining = random.randint(5, 30)
+                    current_green = LANES[tick_greens[i]]
+                    phase_remaining = tick_phases[i]
 
                     # RL suggestion: pick densest lane
-                    dens_sorted = sorted(lanes.items(), key=lambda x: x[1]["density_score"], reverse=True)
-                    suggested_lane = dens_sorted[0][0]
-                    suggested_duration = max(10, min(60, dens_sorted[0][1]["density_score"] * 2))
-                    rl_confidence = round(random.uniform(0.4, 0.98), 2)
+                    suggested_lane, suggested_data = max(lanes.items(), key=lambda kv: kv[1]["density_score"])
+                    suggested_duration = max(10, min(60, suggested_data["density_score"] * 2))
+                    rl_confidence = tick_confidence[i]
                     rl_suggestion = {
                         "next_green": suggested_lane,
                         "duration": suggested_duration,
@@ -63,33 +108,30 @@ async def publisher():
                     }
 
                 # Emergency + Violations
-                emergency_vehicle = random.random() < 0.1
+                emergency_vehicle = tick_emergency[i]
                 violations = []
-                if random.random() < 0.05:
+                if tick_violation[i]:
                     violations.append({
                         "plate": random_plate(),
-                        "lane": random.choice(list(lanes.keys())),
-                        "time": now_iso()
+                        "lane": LANES[tick_violation_lanes[i]],
+                        "time": now
                     })
 
-                # Build msg
-                msg = {
-                    "type": "junction_update",
-                    "junction_id": jid,
-                    "name": j["name"],
-                    "lat": j["lat"],
-                    "lon": j["lon"],
-                    "timestamp": now_iso(),
-                    "lanes": lanes,
-                    "current_green": current_green,
-                    "phase_remaining": phase_remaining,
-                    "rl_suggestion": rl_suggestion if 'rl_suggestion' in locals() else None,
-                    "emergency_vehicle": emergency_vehicle,
-                    "violations": violations,
-                }
+                # Build msg from the static template
+                msg = templates[jid].copy()
+                msg["timestamp"] = now
+                msg["lanes"] = lanes
+                msg["current_green"] = current_green
+                msg["phase_remaining"] = phase_remaining
+                msg["rl_suggestion"] = rl_suggestion
+                msg["emergency_vehicle"] = emergency_vehicle
+                msg["violations"] = violations
 
-                await ws.send(json.dumps(msg))
-                await asyncio.sleep(0.5)
+                frames.append(packb(msg))
+
+            # Send the whole tick back-to-back, then sleep once
+            for frame in frames:
+                await ws.send(frame)
 
             await asyncio.sleep(1.0)
 
@@ -99,27 +141,41 @@ async def publisher():
 # -------------------------------------------------
 async def override_listener():
     uri = "ws://localhost:8000/ws/dashboard"
-    async with websockets.connect(uri) as ws:
-        print("👂 Listening for overrides from backend...")
-        async for msg in ws:
-            data = json.loads(msg)
-            if data.get("type") == "override":
-                jid = data["junction_id"]
-                lane = data["payload"]["lane"]
-                duration = int(data["payload"]["duration"])
-                end_time = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(seconds=duration)
-                active_overrides[jid] = {"lane": lane, "end_time": end_time}
-                print(f"⚡ Override received: {jid} → {lane} for {duration}s")
-
+    backoff = 1.0
+    while True:
+        try:
+            async with websockets.connect(uri, **WS_OPTIONS) as ws:
+                print("👂 Listening for overrides from backend...")
+                backoff = 1.0
+                async for msg in ws:
+                    data = orjson.loads(msg)
+                    if data.get("type") == "override":
+                        jid = data["junction_id"]
+                        lane = data["payload"]["lane"]
+                        duration = int(data["payload"]["duration"])
+                        end_ns = time.monotonic_ns() + duration * 1_000_000_000
+                        active_overrides[jid] = (lane, end_ns)
+                        print(f"⚡ Override received: {jid} → {lane} for {duration}s")
+        except (OSError, websockets.ConnectionClosed) as e:
+            print(f"⚠️ Override listener disconnected ({e!r})")
+        # The backend may shed slow dashboards (code 1013); reconnect with backoff
+        print(f"🔁 Reconnecting override listener in {backoff:.0f}s")
+        await asyncio.sleep(backoff)
+        backoff = min(backoff * 2, 30.0)
 
 # -------------------------------------------------
 # Run publisher + listener concurrently
 # -------------------------------------------------
 async def main():
+    shards = [JUNCTIONS[i:i + SHARD_SIZE] for i in range(0, len(JUNCTIONS), SHARD_SIZE)]
     await asyncio.gather(
-        publisher(),
+        *(publisher(shard) for shard in shards),
         override_listener()
     )
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    # uvloop.run() only exists in uvloop >= 0.18
+    if uvloop is not None and hasattr(uvloop, "run"):
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
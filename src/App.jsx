@@ -34,30 +34,56 @@ export default function App() {
   const wsRef = useRef(null);
 
   useEffect(() => {
-    const ws = new WebSocket("ws://localhost:8000/ws/dashboard");
-    wsRef.current = ws;
-    ws.onopen = () => console.log("WS connected");
-    ws.onmessage = (evt) => {
-      try {
-        const msg = JSON.parse(evt.data);
-        if (msg.type === "snapshot" && msg.junctions) {
-          const map = {};
-          msg.junctions.forEach(j => map[j.junction_id] = j);
-          setJunctions(map);
-        } else if (msg.type === "junction_update") {
-          setJunctions(prev => ({ ...prev, [msg.junction_id]: msg }));
-          if (msg.violations && msg.violations.length) {
-            setViolationsLog(prev => [...msg.violations, ...prev].slice(0, 200));
+    const decoder = new TextDecoder();
+    let backoff = 1000;
+    let retryTimer = null;
+    let closedByUs = false;
+
+    const connect = () => {
+      const ws = new WebSocket("ws://localhost:8000/ws/dashboard");
+      wsRef.current = ws;
+      // Backend sends JSON in binary frames
+      ws.binaryType = "arraybuffer";
+      ws.onopen = () => {
+        console.log("WS connected");
+        backoff = 1000;
+      };
+      ws.onmessage = (evt) => {
+        try {
+          const text = typeof evt.data === "string" ? evt.data : decoder.decode(evt.data);
+          const msg = JSON.parse(text);
+          if (msg.type === "snapshot" && msg.junctions) {
+            const map = {};
+            msg.junctions.forEach(j => map[j.junction_id] = j);
+            setJunctions(map);
+          } else if (msg.type === "junction_update") {
+            setJunctions(prev => ({ ...prev, [msg.junction_id]: msg }));
+            if (msg.violations && msg.violations.length) {
+              setViolationsLog(prev => [...msg.violations, ...prev].slice(0, 200));
+            }
+          } else if (msg.type === "override") {
+            console.log("Override event", msg);
           }
-        } else if (msg.type === "override") {
-          console.log("Override event", msg);
+        } catch (e) {
+          console.error("WS parse", e);
         }
-      } catch (e) {
-        console.error("WS parse", e);
-      }
+      };
+      // Backend may shed slow dashboards (code 1013); reconnect with backoff.
+      // The fresh snapshot on connect resyncs state.
+      ws.onclose = (evt) => {
+        console.log("WS closed", evt.code);
+        if (closedByUs) return;
+        retryTimer = setTimeout(connect, backoff);
+        backoff = Math.min(backoff * 2, 30000);
+      };
+    };
+
+    connect();
+    return () => {
+      closedByUs = true;
+      clearTimeout(retryTimer);
+      if (wsRef.current) wsRef.current.close();
     };
-    ws.onclose = () => console.log("WS closed");
-    return () => ws.close();
   }, []);
 
   const junctionArray = Object.values(junctions);